@@ -1,184 +1,591 @@
+import asyncio
 import boto3
-import json
 import streamlit as st
 import time
-from datetime import datetime
-import pandas as pd
+from collections import deque
+from dataclasses import dataclass
+from botocore.config import Config
+
+# aioboto3 is optional - only needed for parallel model comparison
+try:
+    import aioboto3
+    from aiobotocore.config import AioConfig
+except ImportError:
+    aioboto3 = None
+
+# Prefer orjson for request/response (de)serialization, fall back to stdlib json
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    import json
+    _loads = json.loads
+
+    def _dumps(obj):
+        # Match orjson: compact output, encoded as bytes
+        return json.dumps(obj, separators=(',', ':')).encode()
+
+# tiktoken is optional - gives closer offline token counts for the preset prompts
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# msgspec is optional - lets Claude responses be decoded straight into the fields we use
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+if msgspec is not None:
+    class ClaudeContentBlock(msgspec.Struct):
+        text: str = ''
+
+    class ClaudeUsage(msgspec.Struct):
+        input_tokens: int = 0
+        output_tokens: int = 0
+        cache_read_input_tokens: int = 0
+        cache_creation_input_tokens: int = 0
+
+    class ClaudeResponse(msgspec.Struct):
+        """Only the Claude response fields the app reads - other keys are skipped"""
+        content: list[ClaudeContentBlock]
+        usage: ClaudeUsage
+
+    _claude_decoder = msgspec.json.Decoder(ClaudeResponse)
+else:
+    _claude_decoder = None
+
+# Bedrock is available in specific regions
+BEDROCK_REGION = 'us-east-1'
+
+# Reuse pooled HTTPS connections across calls and reruns - a pool of 32 lets
+# concurrent requests share warm connections instead of paying new TLS handshakes
+BEDROCK_CLIENT_SETTINGS = dict(
+    max_pool_connections=32,
+    tcp_keepalive=True,
+    connect_timeout=3,
+    read_timeout=60,  # long generations can take a while to finish
+    retries={'max_attempts': 3, 'mode': 'adaptive'}
+)
+BEDROCK_CLIENT_CONFIG = Config(**BEDROCK_CLIENT_SETTINGS)
+# aiobotocore clients need their own config type with the same settings
+BEDROCK_ASYNC_CLIENT_CONFIG = (
+    AioConfig(**BEDROCK_CLIENT_SETTINGS) if aioboto3 is not None else None
+)
+
+@st.cache_resource
+def _get_session(region, profile_name=None):
+    """Create the boto3 Session once per region/profile so credentials are resolved once"""
+    return boto3.Session(region_name=region, profile_name=profile_name)
+
+@st.cache_resource
+def _cached_bedrock_client(region, profile_name):
+    """One pooled client per region/profile, shared across reruns"""
+    return _get_session(region, profile_name).client('bedrock-runtime', config=BEDROCK_CLIENT_CONFIG)
 
 # Configure AWS Bedrock client
+def get_bedrock_client(region=BEDROCK_REGION, profile_name=None, session=None):
+    """
+    Initialize Bedrock Runtime client
+
+    Pass a pre-configured boto3 Session as `session` to use custom credentials. Such clients
+    are built fresh rather than cached, since a session can't be used as a cache key.
+    """
+    if session is not None:
+        return session.client('bedrock-runtime', config=BEDROCK_CLIENT_CONFIG)
+    return _cached_bedrock_client(region, profile_name)
+
 @st.cache_resource
-def get_bedrock_client():
-    """Initialize Bedrock Runtime client"""
-    return boto3.client(
-        'bedrock-runtime',
-        region_name='us-east-1'  # Bedrock is available in specific regions
-    )
+def get_async_session(region=BEDROCK_REGION):
+    """Shared aioboto3 Session for concurrent Bedrock calls"""
+    return aioboto3.Session(region_name=region)
+
+@dataclass(frozen=True, slots=True)
+class ModelSpec:
+    """Static configuration and pricing for a foundation model"""
+    id: str
+    family: str  # key into FAMILY_HANDLERS
+    input_price_per_1k: float
+    output_price_per_1k: float
+    max_tokens: int
+    description: str
+    # Only e.g. Claude 3.5 Haiku / Llama 3.1 70B+405B via the us-east-2 cross-region profile
+    latency_optimized: bool = False
+    # Bedrock prompt caching (cache_control checkpoints) - only newer Claude models support it
+    prompt_caching: bool = False
 
 # Model configurations with pricing info
 MODELS = {
-    'Claude 3 Sonnet': {
-        'id': 'anthropic.claude-3-sonnet-20240229-v1:0',
-        'input_price_per_1k': 0.003,
-        'output_price_per_1k': 0.015,
-        'max_tokens': 4096,
-        'description': 'Best for reasoning, analysis, creative writing'
-    },
-    'Claude 3 Haiku': {
-        'id': 'anthropic.claude-3-haiku-20240307-v1:0',
-        'input_price_per_1k': 0.00025,
-        'output_price_per_1k': 0.00125,
-        'max_tokens': 4096,
-        'description': 'Fastest and most cost-effective'
-    },
-    'Llama 2 70B': {
-        'id': 'meta.llama2-70b-chat-v1',
-        'input_price_per_1k': 0.00195,
-        'output_price_per_1k': 0.00256,
-        'max_tokens': 2048,
-        'description': 'Open-source, good for general tasks'
-    },
-    'Titan Text G1 - Express': {
-        'id': 'amazon.titan-text-express-v1',
-        'input_price_per_1k': 0.0008,
-        'output_price_per_1k': 0.0016,
-        'max_tokens': 8192,
-        'description': 'AWS native, cost-effective for basic tasks'
+    'Claude 3 Sonnet': ModelSpec(
+        id='anthropic.claude-3-sonnet-20240229-v1:0',
+        family='claude',
+        input_price_per_1k=0.003,
+        output_price_per_1k=0.015,
+        max_tokens=4096,
+        description='Best for reasoning, analysis, creative writing',
+        latency_optimized=False,
+        prompt_caching=False
+    ),
+    'Claude 3 Haiku': ModelSpec(
+        id='anthropic.claude-3-haiku-20240307-v1:0',
+        family='claude',
+        input_price_per_1k=0.00025,
+        output_price_per_1k=0.00125,
+        max_tokens=4096,
+        description='Fastest and most cost-effective',
+        latency_optimized=False,
+        prompt_caching=False
+    ),
+    'Llama 2 70B': ModelSpec(
+        id='meta.llama2-70b-chat-v1',
+        family='llama',
+        input_price_per_1k=0.00195,
+        output_price_per_1k=0.00256,
+        max_tokens=2048,
+        description='Open-source, good for general tasks',
+        latency_optimized=False,
+        prompt_caching=False
+    ),
+    'Titan Text G1 - Express': ModelSpec(
+        id='amazon.titan-text-express-v1',
+        family='titan',
+        input_price_per_1k=0.0008,
+        output_price_per_1k=0.0016,
+        max_tokens=8192,
+        description='AWS native, cost-effective for basic tasks',
+        latency_optimized=False,
+        prompt_caching=False
+    )
+}
+
+# Model comparison table rows - MODELS never changes at runtime, so build them once
+COMPARISON_ROWS = [
+    {
+        'Model': name,
+        'Input $/1K': f"${config.input_price_per_1k:.4f}",
+        'Output $/1K': f"${config.output_price_per_1k:.4f}",
+        'Max Tokens': f"{config.max_tokens:,}",
+        'Best For': config.description[:30] + "..."
+    }
+    for name, config in MODELS.items()
+]
+
+# Footer learning tips
+API_TIPS = """
+**API Mastery:**
+• `invoke_model`: Single response
+• `invoke_model_with_response_stream`: Real-time streaming
+• Different models need different request formats
+"""
+
+COST_TIPS = """
+**Cost Optimization:**
+• Choose the right model for your task
+• Use Haiku for simple tasks (cheapest)
+• Monitor token usage closely
+• Consider caching for repeated requests
+"""
+
+# Prompt caching needs a minimum prefix length before Bedrock will create a checkpoint
+CACHE_MIN_TOKENS = 1024
+# Cache reads/writes are billed relative to the normal input token price
+CACHE_READ_PRICE_MULTIPLIER = 0.1
+CACHE_WRITE_PRICE_MULTIPLIER = 1.25
+
+def estimate_tokens(text):
+    """Rough token estimate (~4 characters per token)"""
+    return len(text) // 4
+
+# Quick prompts offered as buttons in the UI: (label, prompt, column)
+PRESET_PROMPTS: tuple[tuple[str, str, int], ...] = (
+    ("📝 Creative Story",
+     "Write a short science fiction story about an AI that discovers emotions for the first time.", 0),
+    ("🧠 Explain Concept",
+     "Explain quantum computing in simple terms that a 12-year-old could understand.", 0),
+    ("💼 Business Email",
+     "Write a professional email declining a meeting request due to scheduling conflicts.", 1),
+    ("🔍 Data Analysis",
+     "Analyze the pros and cons of remote work vs office work for software developers.", 1),
+)
+
+@st.cache_resource
+def preset_token_counts():
+    """
+    Count preset prompt tokens once per server process, on first use
+
+    cl100k_base is not Claude's tokenizer, but it is a much closer offline approximation
+    than the character estimate. Caching the result also remembers a failed load, so an
+    offline host doesn't retry the download on every rerun.
+    """
+    if tiktoken is not None:
+        try:
+            # The first call downloads the BPE file, which fails on offline hosts
+            encoding = tiktoken.get_encoding('cl100k_base')
+            return {text: len(encoding.encode(text)) for _, text, _ in PRESET_PROMPTS}
+        except Exception:
+            pass
+    return {text: estimate_tokens(text) for _, text, _ in PRESET_PROMPTS}
+
+def prompt_tokens(prompt):
+    """Input token count for a prompt - cached for presets, estimated otherwise"""
+    count = preset_token_counts().get(prompt)
+    return count if count is not None else estimate_tokens(prompt)
+
+def build_claude_content(prompt, system_context=None, prompt_caching=False):
+    """
+    Build the Claude user message content, marking a long static context as cacheable
+    when the model supports prompt caching
+    """
+    if not system_context:
+        return prompt
+    
+    context_block = {"type": "text", "text": system_context}
+    if prompt_caching and estimate_tokens(system_context) >= CACHE_MIN_TOKENS:
+        context_block["cache_control"] = {"type": "ephemeral"}
+    return [context_block, {"type": "text", "text": prompt}]
+
+# Pre-serialized request bodies - only the prompt, max tokens and temperature vary per call
+_CLAUDE_TMPL = (
+    b'{"anthropic_version":"bedrock-2023-05-31",'
+    b'"messages":[{"role":"user","content":%s}],'
+    b'"max_tokens":%d,"temperature":%f}'
+)
+_LLAMA_TMPL = b'{"prompt":%s,"max_gen_len":%d,"temperature":%f,"top_p":0.9}'
+_TITAN_TMPL = (
+    b'{"inputText":%s,'
+    b'"textGenerationConfig":{"maxTokenCount":%d,"temperature":%f,"topP":1,"stopSequences":[]}}'
+)
+
+def parsed_result(text, input_tokens, output_tokens, cache_read_tokens=0, cache_write_tokens=0):
+    """Result returned when an invocation succeeds"""
+    return {
+        'text': text,
+        'input_tokens': input_tokens,
+        'output_tokens': output_tokens,
+        'cache_read_tokens': cache_read_tokens,
+        'cache_write_tokens': cache_write_tokens,
+        'success': True
     }
+
+# Claude format
+def _build_claude(prompt, max_tokens, temperature, system_context=None, prompt_caching=False):
+    content = build_claude_content(prompt, system_context, prompt_caching)
+    return _CLAUDE_TMPL % (_dumps(content), max_tokens, temperature)
+
+def _parse_claude(body_bytes):
+    if _claude_decoder is not None:
+        # Typed decode - skips every field we don't read
+        response_body = _claude_decoder.decode(body_bytes)
+        usage = response_body.usage
+        return parsed_result(
+            response_body.content[0].text,
+            usage.input_tokens,
+            usage.output_tokens,
+            usage.cache_read_input_tokens,
+            usage.cache_creation_input_tokens
+        )
+    
+    response_body = _loads(body_bytes)
+    usage = response_body['usage']
+    return parsed_result(
+        response_body['content'][0]['text'],
+        usage['input_tokens'],
+        usage['output_tokens'],
+        usage.get('cache_read_input_tokens', 0),
+        usage.get('cache_creation_input_tokens', 0)
+    )
+
+def _parse_claude_stream(chunk):
+    if chunk['type'] == 'content_block_delta':
+        return chunk['delta']['text']
+    return ''
+
+# Llama format
+def _build_llama(prompt, max_tokens, temperature, system_context=None, prompt_caching=False):
+    return _LLAMA_TMPL % (_dumps(f"<s>[INST] {prompt} [/INST]"), max_tokens, temperature)
+
+def _parse_llama(body_bytes):
+    response_body = _loads(body_bytes)
+    return parsed_result(
+        response_body['generation'],
+        response_body.get('prompt_token_count', 0),
+        response_body.get('generation_token_count', 0)
+    )
+
+def _parse_llama_stream(chunk):
+    return chunk.get('generation', '')
+
+# Titan format
+def _build_titan(prompt, max_tokens, temperature, system_context=None, prompt_caching=False):
+    return _TITAN_TMPL % (_dumps(prompt), max_tokens, temperature)
+
+def _parse_titan(body_bytes):
+    response_body = _loads(body_bytes)
+    return parsed_result(
+        response_body['results'][0]['outputText'],
+        response_body['inputTextTokenCount'],
+        response_body['results'][0]['tokenCount']
+    )
+
+def _parse_titan_stream(chunk):
+    return chunk.get('outputText', '')
+
+# (build_body, parse_response, parse_stream_chunk) for each model family
+FAMILY_HANDLERS = {
+    'claude': (_build_claude, _parse_claude, _parse_claude_stream),
+    'llama': (_build_llama, _parse_llama, _parse_llama_stream),
+    'titan': (_build_titan, _parse_titan, _parse_titan_stream),
 }
 
-def invoke_bedrock_model(client, model_id, prompt, max_tokens=1000, temperature=0.7):
+def error_result(e):
+    """Result returned when an invocation fails"""
+    return {
+        'text': f"Error: {str(e)}",
+        'input_tokens': 0,
+        'output_tokens': 0,
+        'cache_read_tokens': 0,
+        'cache_write_tokens': 0,
+        'success': False,
+        'error': str(e)
+    }
+
+def performance_kwargs(performance_config):
+    """Extra invoke_model arguments for latency-optimized inference"""
+    if performance_config:
+        # e.g. 'optimized' routes to latency-optimized endpoints
+        return {'performanceConfigLatency': performance_config}
+    return {}
+
+def invoke_bedrock_model(client, model_config, prompt, max_tokens=1000, temperature=0.7,
+                         performance_config=None, system_context=None):
     """
     Invoke Bedrock model - handles different model formats
     """
     try:
-        if 'anthropic.claude' in model_id:
-            # Claude format
-            body = {
-                "anthropic_version": "bedrock-2023-05-31",
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ],
-                "max_tokens": max_tokens,
-                "temperature": temperature
-            }
-        elif 'meta.llama2' in model_id:
-            # Llama format
-            body = {
-                "prompt": f"<s>[INST] {prompt} [/INST]",
-                "max_gen_len": max_tokens,
-                "temperature": temperature,
-                "top_p": 0.9
-            }
-        elif 'amazon.titan' in model_id:
-            # Titan format
-            body = {
-                "inputText": prompt,
-                "textGenerationConfig": {
-                    "maxTokenCount": max_tokens,
-                    "temperature": temperature,
-                    "topP": 1,
-                    "stopSequences": []
-                }
-            }
+        build_body, parse_response, _ = FAMILY_HANDLERS[model_config.family]
+        body = build_body(
+            prompt, max_tokens, temperature, system_context, model_config.prompt_caching
+        )
         
         # Make the API call
         response = client.invoke_model(
-            modelId=model_id,
-            body=json.dumps(body),
-            contentType='application/json'
+            modelId=model_config.id,
+            body=body,
+            contentType='application/json',
+            **performance_kwargs(performance_config)
         )
         
         # Parse response based on model
-        response_body = json.loads(response['body'].read())
+        return parse_response(response['body'].read())
         
-        if 'anthropic.claude' in model_id:
-            text = response_body['content'][0]['text']
-            input_tokens = response_body['usage']['input_tokens']
-            output_tokens = response_body['usage']['output_tokens']
-        elif 'meta.llama2' in model_id:
-            text = response_body['generation']
-            input_tokens = response_body.get('prompt_token_count', 0)
-            output_tokens = response_body.get('generation_token_count', 0)
-        elif 'amazon.titan' in model_id:
-            text = response_body['results'][0]['outputText']
-            input_tokens = response_body['inputTextTokenCount']
-            output_tokens = response_body['results'][0]['tokenCount']
+    except Exception as e:
+        return error_result(e)
+
+async def ainvoke_bedrock_model(client, model_config, prompt, max_tokens=1000, temperature=0.7,
+                                performance_config=None, system_context=None):
+    """
+    Invoke Bedrock model asynchronously on an open aioboto3 client, timing the call
+    """
+    start_time = time.time()
+    try:
+        build_body, parse_response, _ = FAMILY_HANDLERS[model_config.family]
+        body = build_body(
+            prompt, max_tokens, temperature, system_context, model_config.prompt_caching
+        )
         
-        return {
-            'text': text,
-            'input_tokens': input_tokens,
-            'output_tokens': output_tokens,
-            'success': True
-        }
+        response = await client.invoke_model(
+            modelId=model_config.id,
+            body=body,
+            contentType='application/json',
+            **performance_kwargs(performance_config)
+        )
+        result = parse_response(await response['body'].read())
         
     except Exception as e:
-        return {
-            'text': f"Error: {str(e)}",
-            'input_tokens': 0,
-            'output_tokens': 0,
-            'success': False,
-            'error': str(e)
-        }
-
-def invoke_bedrock_streaming(client, model_id, prompt, max_tokens=1000, temperature=0.7):
+        result = error_result(e)
+    
+    result['response_time'] = time.time() - start_time
+    return result
+
+async def compare_models(session, model_names, prompt, max_tokens=1000, temperature=0.7,
+                         latency_optimized=False, system_context=None):
+    """
+    Invoke several models concurrently - wall-clock is the slowest model, not the sum
+
+    All requests share one pooled client, so they reuse its connections. Note that
+    system_context only reaches Claude models; Llama and Titan see the bare prompt.
+    """
+    async with session.client('bedrock-runtime', config=BEDROCK_ASYNC_CLIENT_CONFIG) as client:
+        return await asyncio.gather(*[
+            ainvoke_bedrock_model(
+                client, MODELS[name], prompt,
+                min(max_tokens, MODELS[name].max_tokens), temperature,
+                performance_config=(
+                    'optimized' if latency_optimized and MODELS[name].latency_optimized else None
+                ),
+                system_context=system_context
+            )
+            for name in model_names
+        ])
+
+# Streamed text is buffered and only yielded once this many characters are pending...
+CHUNK_CHARS = 64
+# ...or this many milliseconds have passed since the last yield. Claude deltas arrive
+# roughly every 30 ms, so this has to sit well above that to coalesce anything
+FLUSH_MS = 200
+
+class StreamBuffer:
+    """
+    Collects streamed deltas and releases them once enough text or time has built up
+    """
+    def __init__(self, chunk_chars=CHUNK_CHARS, flush_ms=FLUSH_MS):
+        self.chunk_chars = chunk_chars
+        self.flush_ms = flush_ms
+        self.pending = []
+        self.pending_chars = 0
+        self.last_flush = time.monotonic()
+    
+    def add(self, delta):
+        """Buffer a delta, returning the pending text if it is time to flush"""
+        if not delta:
+            return None
+        self.pending.append(delta)
+        self.pending_chars += len(delta)
+        
+        now = time.monotonic()
+        if self.pending_chars >= self.chunk_chars or (now - self.last_flush) * 1000 >= self.flush_ms:
+            return self.flush()
+        return None
+    
+    def flush(self):
+        """Return and clear whatever text is pending"""
+        if not self.pending:
+            return None
+        text = ''.join(self.pending)
+        self.pending = []
+        self.pending_chars = 0
+        self.last_flush = time.monotonic()
+        return text
+
+def record_stream_usage(chunk, usage):
+    """
+    Copy token counts from the stream - Claude's message_start carries the prompt cache
+    counts, and Bedrock attaches invocation metrics to the final event (Claude's message_stop)
+    """
+    if usage is None:
+        return
+    
+    if chunk.get('type') == 'message_start':
+        message_usage = chunk['message'].get('usage', {})
+        usage['cache_read_tokens'] = message_usage.get('cache_read_input_tokens', 0)
+        usage['cache_write_tokens'] = message_usage.get('cache_creation_input_tokens', 0)
+    
+    metrics = chunk.get('amazon-bedrock-invocationMetrics')
+    if metrics:
+        usage['input_tokens'] = metrics['inputTokenCount']
+        usage['output_tokens'] = metrics['outputTokenCount']
+        if 'cacheReadInputTokenCount' in metrics:
+            usage['cache_read_tokens'] = metrics['cacheReadInputTokenCount']
+        if 'cacheWriteInputTokenCount' in metrics:
+            usage['cache_write_tokens'] = metrics['cacheWriteInputTokenCount']
+
+def invoke_bedrock_streaming(client, model_config, prompt, max_tokens=1000, temperature=0.7,
+                             performance_config=None, system_context=None,
+                             chunk_chars=CHUNK_CHARS, flush_ms=FLUSH_MS, usage=None):
     """
-    Invoke Bedrock model with streaming response
+    Invoke Bedrock model with streaming response, yielding new text in coalesced chunks
+
+    Pass a dict as `usage` to receive the token counts once the stream finishes.
     """
     try:
-        if 'anthropic.claude' in model_id:
-            body = {
-                "anthropic_version": "bedrock-2023-05-31",
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": max_tokens,
-                "temperature": temperature
-            }
-        elif 'meta.llama2' in model_id:
-            body = {
-                "prompt": f"<s>[INST] {prompt} [/INST]",
-                "max_gen_len": max_tokens,
-                "temperature": temperature,
-                "top_p": 0.9
-            }
-        elif 'amazon.titan' in model_id:
-            body = {
-                "inputText": prompt,
-                "textGenerationConfig": {
-                    "maxTokenCount": max_tokens,
-                    "temperature": temperature,
-                    "topP": 1
-                }
-            }
+        build_body, _, parse_stream_chunk = FAMILY_HANDLERS[model_config.family]
+        body = build_body(
+            prompt, max_tokens, temperature, system_context, model_config.prompt_caching
+        )
         
         # Streaming API call
         response = client.invoke_model_with_response_stream(
-            modelId=model_id,
-            body=json.dumps(body),
-            contentType='application/json'
+            modelId=model_config.id,
+            body=body,
+            contentType='application/json',
+            **performance_kwargs(performance_config)
         )
         
-        # Process streaming response
-        full_text = ""
+        # Process streaming response - only hand text to the UI once enough has built up
+        buffer = StreamBuffer(chunk_chars, flush_ms)
         for event in response['body']:
-            chunk = json.loads(event['chunk']['bytes'])
-            
-            if 'anthropic.claude' in model_id:
-                if chunk['type'] == 'content_block_delta':
-                    full_text += chunk['delta']['text']
-            elif 'meta.llama2' in model_id:
-                full_text += chunk.get('generation', '')
-            elif 'amazon.titan' in model_id:
-                full_text += chunk.get('outputText', '')
-                
-            yield full_text
+            chunk = _loads(event['chunk']['bytes'])
+            record_stream_usage(chunk, usage)
+            text = buffer.add(parse_stream_chunk(chunk))
+            if text:
+                yield text
+        
+        text = buffer.flush()
+        if text:
+            yield text
             
     except Exception as e:
-        yield f"Streaming Error: {str(e)}"
+        if usage is not None:
+            usage['error'] = str(e)
+        yield f"\n\nStreaming Error: {str(e)}"
+
+def calculate_cost(input_tokens, output_tokens, model_config,
+                   cache_read_tokens=0, cache_write_tokens=0):
+    """Calculate the cost of the API call, including prompt cache reads/writes"""
+    input_price = model_config.input_price_per_1k
+    input_cost = (input_tokens / 1000) * input_price
+    cache_cost = (
+        (cache_read_tokens / 1000) * input_price * CACHE_READ_PRICE_MULTIPLIER
+        + (cache_write_tokens / 1000) * input_price * CACHE_WRITE_PRICE_MULTIPLIER
+    )
+    output_cost = (output_tokens / 1000) * model_config.output_price_per_1k
+    return input_cost + cache_cost + output_cost
+
+def render_stream(stream, placeholder):
+    """
+    Show streamed text as plain text while it arrives, then parse it as Markdown once at the end
 
-def calculate_cost(input_tokens, output_tokens, model_config):
-    """Calculate the cost of the API call"""
-    input_cost = (input_tokens / 1000) * model_config['input_price_per_1k']
-    output_cost = (output_tokens / 1000) * model_config['output_price_per_1k']
-    return input_cost + output_cost
+    Returns the full text.
+    """
+    # Extend a running string rather than re-joining every chunk received so far
+    full_text = ''
+    for chunk in stream:
+        full_text += chunk
+        placeholder.text(full_text)
+    
+    placeholder.markdown(full_text)
+    return full_text
+
+# Only the most recent requests are kept in the usage history
+USAGE_HISTORY_LIMIT = 500
+
+def new_usage_history():
+    """Bounded usage history - the oldest entries are dropped once the limit is reached"""
+    return deque(maxlen=USAGE_HISTORY_LIMIT)
+
+def use_preset_prompt(preset_prompt):
+    """Button callback - put a preset into the prompt text area before the rerun"""
+    st.session_state.prompt = preset_prompt
+
+def new_usage_stats():
+    """
+    Running totals so reruns don't have to re-sum usage_history
+
+    These cover every request in the session, including ones already dropped from the history.
+    """
+    return {'total_cost': 0.0, 'total_tokens': 0, 'total_time': 0.0, 'count': 0}
+
+def record_usage(usage_data):
+    """Append a request to the usage history and update the running totals"""
+    st.session_state.usage_history.append(usage_data)
+    
+    stats = st.session_state.stats
+    stats['total_cost'] += usage_data['cost']
+    stats['total_tokens'] += usage_data['input_tokens'] + usage_data['output_tokens']
+    stats['total_time'] += usage_data.get('response_time', 0)
+    stats['count'] += 1
 
 def main():
     st.set_page_config(
@@ -192,7 +599,9 @@ def main():
     
     # Initialize session state
     if 'usage_history' not in st.session_state:
-        st.session_state.usage_history = []
+        st.session_state.usage_history = new_usage_history()
+    if 'stats' not in st.session_state:
+        st.session_state.stats = new_usage_stats()
     
     # Sidebar - Model Configuration
     st.sidebar.header("🔧 Model Configuration")
@@ -209,21 +618,21 @@ def main():
     st.sidebar.info(f"""
     **{selected_model}**
     
-    {model_config['description']}
+    {model_config.description}
     
     **Pricing:**
-    • Input: ${model_config['input_price_per_1k']:.4f}/1K tokens
-    • Output: ${model_config['output_price_per_1k']:.4f}/1K tokens
+    • Input: ${model_config.input_price_per_1k:.4f}/1K tokens
+    • Output: ${model_config.output_price_per_1k:.4f}/1K tokens
     
-    **Max Tokens:** {model_config['max_tokens']:,}
+    **Max Tokens:** {model_config.max_tokens:,}
     """)
     
     # Model parameters
     max_tokens = st.sidebar.slider(
         "Max Tokens:",
         min_value=100,
-        max_value=model_config['max_tokens'],
-        value=min(1000, model_config['max_tokens']),
+        max_value=model_config.max_tokens,
+        value=min(1000, model_config.max_tokens),
         step=100
     )
     
@@ -242,6 +651,33 @@ def main():
         help="Stream response in real-time vs wait for complete response"
     )
     
+    chunk_chars = st.sidebar.slider(
+        "Stream Chunk Size (chars):",
+        min_value=1,
+        max_value=512,
+        value=CHUNK_CHARS,
+        disabled=not streaming_mode,
+        help="Buffer streamed text and refresh the response once this many characters arrive"
+    )
+    
+    latency_optimized = st.sidebar.checkbox(
+        "Latency-optimized inference",
+        value=False,
+        disabled=not model_config.latency_optimized,
+        help="Route requests to latency-optimized endpoints (only some models support this)"
+    )
+    performance_config = (
+        'optimized' if latency_optimized and model_config.latency_optimized else None
+    )
+    
+    system_context = st.sidebar.text_area(
+        "Cached system context:",
+        height=120,
+        help=f"Static context sent ahead of every Claude prompt (ignored by Llama and Titan). "
+             f"On models that support prompt caching it is cached by Bedrock for 5 minutes "
+             f"once it reaches ~{CACHE_MIN_TOKENS:,} tokens."
+    )
+    
     # Main interface
     col1, col2 = st.columns([2, 1])
     
@@ -251,6 +687,7 @@ def main():
         # Prompt input
         prompt = st.text_area(
             "Enter your prompt:",
+            key="prompt",
             height=150,
             placeholder="Ask me anything or give me a creative writing task...",
             help="Try different types of prompts: questions, creative writing, analysis, etc."
@@ -258,19 +695,12 @@ def main():
         
         # Preset prompts
         st.subheader("🎯 Quick Prompts")
-        preset_col1, preset_col2 = st.columns(2)
+        preset_cols = st.columns(2)
         
-        with preset_col1:
-            if st.button("📝 Creative Story"):
-                prompt = "Write a short science fiction story about an AI that discovers emotions for the first time."
-            if st.button("🧠 Explain Concept"):
-                prompt = "Explain quantum computing in simple terms that a 12-year-old could understand."
-        
-        with preset_col2:
-            if st.button("💼 Business Email"):
-                prompt = "Write a professional email declining a meeting request due to scheduling conflicts."
-            if st.button("🔍 Data Analysis"):
-                prompt = "Analyze the pros and cons of remote work vs office work for software developers."
+        # Presets fill the prompt box via session state, so they survive the Generate rerun
+        for label, preset_prompt, column in PRESET_PROMPTS:
+            with preset_cols[column]:
+                st.button(label, on_click=use_preset_prompt, args=(preset_prompt,))
         
         # Generate button
         if st.button("🚀 Generate Text", type="primary", disabled=not prompt):
@@ -285,16 +715,51 @@ def main():
                     
                     if streaming_mode:
                         # Streaming mode
-                        response_placeholder = st.empty()
-                        
+                        stream_usage = {}
                         try:
-                            for partial_response in invoke_bedrock_streaming(
-                                client, model_config['id'], prompt, max_tokens, temperature
-                            ):
-                                response_placeholder.markdown(partial_response)
-                                time.sleep(0.05)  # Small delay for better UX
+                            stream = invoke_bedrock_streaming(
+                                client, model_config, prompt, max_tokens, temperature,
+                                performance_config=performance_config,
+                                system_context=system_context,
+                                chunk_chars=chunk_chars,
+                                usage=stream_usage
+                            )
+                            final_response = render_stream(stream, st.empty())
                             
-                            final_response = partial_response
+                            if 'error' not in stream_usage:
+                                # Fall back to estimates if the stream carried no token counts
+                                if 'input_tokens' in stream_usage:
+                                    input_tokens = stream_usage['input_tokens']
+                                else:
+                                    input_tokens = prompt_tokens(prompt)
+                                    if model_config.family == 'claude' and system_context:
+                                        input_tokens += estimate_tokens(system_context)
+                                output_tokens = stream_usage.get(
+                                    'output_tokens', estimate_tokens(final_response)
+                                )
+                                cache_read_tokens = stream_usage.get('cache_read_tokens', 0)
+                                cache_write_tokens = stream_usage.get('cache_write_tokens', 0)
+                                response_time = time.time() - start_time
+                                cost = calculate_cost(
+                                    input_tokens,
+                                    output_tokens,
+                                    model_config,
+                                    cache_read_tokens=cache_read_tokens,
+                                    cache_write_tokens=cache_write_tokens
+                                )
+                                
+                                record_usage({
+                                    'timestamp_ns': time.time_ns(),
+                                    'model': selected_model,
+                                    'prompt_length': len(prompt),
+                                    'response_length': len(final_response),
+                                    'input_tokens': input_tokens,
+                                    'output_tokens': output_tokens,
+                                    'cache_read_tokens': cache_read_tokens,
+                                    'cache_write_tokens': cache_write_tokens,
+                                    'cost': cost,
+                                    'response_time': response_time
+                                })
                             
                         except Exception as e:
                             st.error(f"Streaming error: {str(e)}")
@@ -304,7 +769,9 @@ def main():
                         # Non-streaming mode
                         with st.spinner("Generating response..."):
                             result = invoke_bedrock_model(
-                                client, model_config['id'], prompt, max_tokens, temperature
+                                client, model_config, prompt, max_tokens, temperature,
+                                performance_config=performance_config,
+                                system_context=system_context
                             )
                         
                         if result['success']:
@@ -317,66 +784,108 @@ def main():
                             cost = calculate_cost(
                                 result['input_tokens'], 
                                 result['output_tokens'], 
-                                model_config
+                                model_config,
+                                cache_read_tokens=result['cache_read_tokens'],
+                                cache_write_tokens=result['cache_write_tokens']
                             )
                             
                             # Store usage data
                             usage_data = {
-                                'timestamp': datetime.now(),
+                                'timestamp_ns': time.time_ns(),
                                 'model': selected_model,
                                 'prompt_length': len(prompt),
                                 'response_length': len(result['text']),
                                 'input_tokens': result['input_tokens'],
                                 'output_tokens': result['output_tokens'],
+                                'cache_read_tokens': result['cache_read_tokens'],
+                                'cache_write_tokens': result['cache_write_tokens'],
                                 'cost': cost,
                                 'response_time': response_time
                             }
-                            st.session_state.usage_history.append(usage_data)
+                            record_usage(usage_data)
                             
                         else:
                             st.error(f"Generation failed: {result['error']}")
-    
+
+        # Side-by-side comparison - models are invoked concurrently
+        st.subheader("⚖️ Compare Models")
+        compare_models_selected = st.multiselect(
+            "Models to compare:",
+            list(MODELS.keys()),
+            default=list(MODELS.keys())[:2],
+            help="Send the same prompt to several models in parallel"
+        )
+
+        if aioboto3 is None:
+            st.caption("Install `aioboto3` to enable parallel model comparison.")
+
+        if st.button(
+            "⚖️ Compare",
+            disabled=not prompt or not compare_models_selected or aioboto3 is None
+        ):
+            with st.spinner(f"Invoking {len(compare_models_selected)} models in parallel..."):
+                results = asyncio.run(compare_models(
+                    get_async_session(), compare_models_selected, prompt,
+                    max_tokens, temperature,
+                    latency_optimized=latency_optimized,
+                    system_context=system_context
+                ))
+
+            result_cols = st.columns(len(compare_models_selected))
+            for result_col, name, result in zip(result_cols, compare_models_selected, results):
+                with result_col:
+                    st.markdown(f"**{name}**")
+                    if result['success']:
+                        cost = calculate_cost(
+                            result['input_tokens'],
+                            result['output_tokens'],
+                            MODELS[name],
+                            cache_read_tokens=result['cache_read_tokens'],
+                            cache_write_tokens=result['cache_write_tokens']
+                        )
+                        st.caption(f"{result['response_time']:.2f}s • ${cost:.4f}")
+                        st.markdown(result['text'])
+
+                        record_usage({
+                            'timestamp_ns': time.time_ns(),
+                            'model': name,
+                            'prompt_length': len(prompt),
+                            'response_length': len(result['text']),
+                            'input_tokens': result['input_tokens'],
+                            'output_tokens': result['output_tokens'],
+                            'cache_read_tokens': result['cache_read_tokens'],
+                            'cache_write_tokens': result['cache_write_tokens'],
+                            'cost': cost,
+                            'response_time': result['response_time']
+                        })
+                    else:
+                        st.error(f"Generation failed: {result['error']}")
+
     with col2:
         st.header("📊 Model Comparison")
         
         # Model comparison table
-        comparison_data = []
-        for name, config in MODELS.items():
-            comparison_data.append({
-                'Model': name,
-                'Input $/1K': f"${config['input_price_per_1k']:.4f}",
-                'Output $/1K': f"${config['output_price_per_1k']:.4f}",
-                'Max Tokens': f"{config['max_tokens']:,}",
-                'Best For': config['description'][:30] + "..."
-            })
-        
-        df = pd.DataFrame(comparison_data)
-        st.dataframe(df, use_container_width=True)
+        st.table(COMPARISON_ROWS)
         
         # Usage statistics
-        if st.session_state.usage_history:
+        stats = st.session_state.stats
+        if stats['count']:
             st.header("📈 Usage Statistics")
             
-            total_cost = sum(item['cost'] for item in st.session_state.usage_history)
-            total_tokens = sum(
-                item['input_tokens'] + item['output_tokens'] 
-                for item in st.session_state.usage_history
-            )
-            avg_response_time = sum(
-                item.get('response_time', 0) for item in st.session_state.usage_history
-            ) / len(st.session_state.usage_history)
+            avg_response_time = stats['total_time'] / stats['count']
             
             col_a, col_b = st.columns(2)
             with col_a:
-                st.metric("Total Cost", f"${total_cost:.4f}")
-                st.metric("Total Tokens", f"{total_tokens:,}")
+                st.metric("Total Cost", f"${stats['total_cost']:.4f}")
+                st.metric("Total Tokens", f"{stats['total_tokens']:,}")
             with col_b:
-                st.metric("Requests", len(st.session_state.usage_history))
+                st.metric("Requests", stats['count'])
                 st.metric("Avg Response Time", f"{avg_response_time:.2f}s")
             
             # Clear history button
             if st.button("🗑️ Clear History"):
-                st.session_state.usage_history = []
+                st.session_state.usage_history = new_usage_history()
+                st.session_state.stats = new_usage_stats()
                 st.rerun()
     
     # Footer with learning tips
@@ -385,21 +894,10 @@ def main():
     
     tip_col1, tip_col2 = st.columns(2)
     with tip_col1:
-        st.info("""
-        **API Mastery:**
-        • `invoke_model`: Single response
-        • `invoke_model_with_response_stream`: Real-time streaming
-        • Different models need different request formats
-        """)
+        st.info(API_TIPS)
     
     with tip_col2:
-        st.success("""
-        **Cost Optimization:**
-        • Choose the right model for your task
-        • Use Haiku for simple tasks (cheapest)
-        • Monitor token usage closely
-        • Consider caching for repeated requests
-        """)
+        st.success(COST_TIPS)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file